@@ -1,12 +1,16 @@
 import streamlit as st
+import streamlit.components.v1 as components
 import pandas as pd
 import geopandas as gpd
+import shapely
 import folium
-from folium import Choropleth
-from streamlit_folium import st_folium
 import plotly.express as px
 import plotly.graph_objects as go
 import numpy as np
+import pyarrow as pa
+import os
+import tempfile
+from pathlib import Path
 
 # ==================== PAGE CONFIG ====================
 st.set_page_config(
@@ -75,10 +79,15 @@ st.markdown("""
 # ==================== LOAD DATA ====================
 @st.cache_data
 def load_data():
-    """Load CSV dan GeoJSON data"""
+    """Load CSV dan data batas kecamatan (FlatGeobuf)"""
     try:
-        df = pd.read_csv("data_stunting.csv")
-        gdf = gpd.read_file("kecamatan_sidoarjo.geojson")
+        df = pd.read_csv(
+            "data_stunting.csv",
+            usecols=["nama_kecamatan", "stunting_balita"],
+            engine="pyarrow",
+            dtype_backend="pyarrow"
+        )
+        gdf = gpd.read_file("kecamatan_sidoarjo.fgb", columns=["WADMKC"], engine="pyogrio")
         return df, gdf
     except FileNotFoundError as e:
         st.error(f"❌ File tidak ditemukan: {e}")
@@ -88,75 +97,165 @@ def load_data():
         st.stop()
 
 # ==================== DATA PROCESSING ====================
+def dissolve_kecamatan(gdf):
+    """Gabungkan polygon desa menjadi satu geometri per kecamatan"""
+    geoms = gdf.geometry.values
+    groups = gdf.groupby("WADMKC", observed=True).indices
+
+    # Single-polygon groups need no union; village boundaries form a
+    # non-overlapping coverage, so the cheaper coverage union is exact
+    dissolved = [
+        geoms[idx[0]] if len(idx) == 1 else shapely.coverage_union_all(np.asarray(geoms[idx]))
+        for idx in groups.values()
+    ]
+
+    return gpd.GeoDataFrame(
+        {"WADMKC": pd.array(list(groups), dtype=gdf["WADMKC"].dtype)},
+        geometry=dissolved,
+        crs=gdf.crs
+    )
+
 @st.cache_data
 def process_data(_df, _gdf):
     """Agregasi dan merge data"""
-    _df["nama_kecamatan"] = _df["nama_kecamatan"].astype(str).str.strip()
+    _df["nama_kecamatan"] = _df["nama_kecamatan"].astype("string[pyarrow]").str.strip()
     _gdf["WADMKC"] = _gdf["WADMKC"].astype(str).str.strip()
     
-    _df["stunting_balita"] = _df["stunting_balita"].astype(str).str.strip().str.lower()
-    _df["stunting_balita"] = _df["stunting_balita"].map({
-        "ya": 1, "y": 1, "tidak": 0, "t": 0
-    }).fillna(0).astype(float)
-    
-    gdf_kec = _gdf.dissolve(by="WADMKC").reset_index()
-    
-    agg_data = _df.groupby("nama_kecamatan").agg({
-        "stunting_balita": ["mean", "sum", "count"]
-    }).reset_index()
-    
-    agg_data.columns = ["nama_kecamatan", "mean_stunting", "jumlah_stunting", "jumlah_balita"]
-    agg_data = agg_data.rename(columns={"nama_kecamatan": "WADMKC"})
-    
-    merged = gdf_kec.merge(agg_data, on="WADMKC", how="left")
-    
-    merged["mean_stunting"] = merged["mean_stunting"].fillna(0)
-    merged["jumlah_balita"] = merged["jumlah_balita"].fillna(0).astype(int)
-    merged["jumlah_stunting"] = merged["jumlah_stunting"].fillna(0).astype(int)
+    # One categorical dtype for both keys so groupby and merge compare int codes
+    kecamatan_dtype = pd.CategoricalDtype(sorted(set(_gdf["WADMKC"].dropna()) | set(_df["nama_kecamatan"].dropna())))
+    _df["nama_kecamatan"] = _df["nama_kecamatan"].astype(kecamatan_dtype)
+    _gdf["WADMKC"] = _gdf["WADMKC"].astype(kecamatan_dtype)
+    
+    # Normalise the few distinct labels once, then broadcast by category code
+    status = _df["stunting_balita"].astype("category")
+    labels = status.cat.categories.astype(str).str.strip().str.casefold()
+    # Only "ya"/"y" count as stunting; "tidak"/"t" and anything else are 0
+    flags = labels.isin(("ya", "y")).astype(np.int8)
+    # Code -1 (missing value) picks the trailing 0
+    _df["stunting_balita"] = np.append(flags, np.int8(0))[status.cat.codes]
+    
+    gdf_kec = dissolve_kecamatan(_gdf)
+    # ~50 m tolerance: invisible at the dashboard zoom, and simplifying the
+    # whole coverage keeps shared borders free of gaps and overlaps
+    simplified = shapely.coverage_simplify(np.asarray(gdf_kec.geometry.values), 0.0005)
+    # Drop the constant Z ordinate and snap to a ~1 m grid so the GeoJSON
+    # sent to the browser carries 2D coordinates with 5 decimals
+    gdf_kec["geometry"] = shapely.set_precision(shapely.force_2d(simplified), 1e-5)
+    
+    # Per-kecamatan counts indexed by category code (-1 = missing name, skipped)
+    codes = _df["nama_kecamatan"].cat.codes.to_numpy()
+    stunting = _df["stunting_balita"].to_numpy().astype(bool)
+    n_kec = len(kecamatan_dtype.categories)
+    balita_per_code = np.bincount(codes[codes >= 0], minlength=n_kec)
+    stunting_per_code = np.bincount(codes[(codes >= 0) & stunting], minlength=n_kec)
+    
+    # Both frames share the categories, so the merge is a positional gather
+    merged = gdf_kec
+    kec_codes = merged["WADMKC"].cat.codes.to_numpy()
+    jumlah_balita = balita_per_code[kec_codes]
+    jumlah_stunting = stunting_per_code[kec_codes]
+    
+    merged["mean_stunting"] = np.divide(
+        jumlah_stunting, jumlah_balita, out=np.zeros(len(merged)), where=jumlah_balita > 0
+    )
+    merged["jumlah_stunting"] = jumlah_stunting.astype(int)
+    merged["jumlah_balita"] = jumlah_balita.astype(int)
     merged["mean_stunting_percent"] = (merged["mean_stunting"] * 100).round(2)
     
-    def categorize(percent):
-        if percent == 0:
-            return "Tidak Ada Data", "#94a3b8"
-        elif percent < 20:
-            return "Rendah", "#22c55e"
-        elif percent < 30:
-            return "Sedang", "#eab308"
-        else:
-            return "Tinggi", "#ef4444"
-    
-    merged[["category", "color"]] = merged["mean_stunting_percent"].apply(
-        lambda x: pd.Series(categorize(x))
+    pct = merged["mean_stunting_percent"].to_numpy()
+    conditions = [pct == 0, pct < 20, pct < 30]
+    # Four fixed levels, stored as categoricals (int8 codes) rather than repeated strings
+    categories = ["Tidak Ada Data", "Rendah", "Sedang", "Tinggi"]
+    colors = ["#94a3b8", "#22c55e", "#eab308", "#ef4444"]
+    merged["category"] = pd.Categorical(
+        np.select(conditions, categories[:3], default=categories[3]), categories=categories, ordered=True
     )
+    merged["color"] = pd.Categorical(np.select(conditions, colors[:3], default=colors[3]), categories=colors)
     
-    merged_with_data = merged[merged["mean_stunting_percent"] > 0].copy()
-    merged_with_data = merged_with_data.sort_values("mean_stunting_percent", ascending=False)
+    # Highest percentage first; ranking, charts, Top 5 and insights reuse this order
+    merged_with_data = merged[pct > 0].sort_values("mean_stunting_percent", ascending=False, kind="stable")
     merged_with_data["rank"] = range(1, len(merged_with_data) + 1)
     
-    merged = merged.merge(
-        merged_with_data[["WADMKC", "rank"]], 
-        on="WADMKC", 
-        how="left"
-    )
-    merged["rank"] = merged["rank"].fillna(0).astype(int)
+    merged["rank"] = merged_with_data["rank"].reindex(merged.index, fill_value=0)
+    
+    total_balita = int(merged["jumlah_balita"].to_numpy().sum())
+    total_stunting = int(merged["jumlah_stunting"].to_numpy().sum())
+    merged.attrs["totals"] = {
+        "balita": total_balita,
+        "stunting": total_stunting,
+        "avg_percent": (total_stunting / total_balita * 100) if total_balita > 0 else 0
+    }
+    # Counted in name order so a tie goes to the category seen first, independent of the ranking sort
+    category_counts = merged_with_data.sort_values("WADMKC")["category"].astype(str).value_counts()
+    merged.attrs["kategori_dominan"] = category_counts.idxmax() if len(merged_with_data) > 0 else "N/A"
+    merged.attrs["kecamatan_tanpa_data"] = merged.loc[pct == 0, "WADMKC"].astype(str).tolist()
+    
+    return merged, merged_with_data
+
+PROCESSED_CACHE = Path(".cache/processed.parquet")
+SOURCE_FILES = [Path("data_stunting.csv"), Path("kecamatan_sidoarjo.fgb"), Path(__file__)]
+# I/O and Parquet decoding failures; anything else is a bug and should surface
+CACHE_ERRORS = (OSError, ValueError, pa.ArrowException)
+
+def write_processed_cache(merged):
+    """Tulis cache GeoParquet secara atomik (file sementara lalu os.replace)"""
+    tmp_path = None
+    try:
+        PROCESSED_CACHE.parent.mkdir(exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=PROCESSED_CACHE.parent, suffix=".parquet.tmp")
+        os.close(fd)
+        merged.to_parquet(tmp_path)
+        # mkstemp creates 0600; keep the cache readable like a plain to_parquet file
+        os.chmod(tmp_path, 0o644)
+        # Readers only ever see the old file or the complete new one
+        os.replace(tmp_path, PROCESSED_CACHE)
+    except CACHE_ERRORS:
+        # Read-only deployment or failed write: keep processing on each cold start
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+@st.cache_data
+def load_processed_data():
+    """Muat hasil olahan dari cache GeoParquet di disk, proses ulang jika sumber berubah"""
+    try:
+        # app.py is a source too, so edits to the processing invalidate the cache
+        source_mtime = max(p.stat().st_mtime for p in SOURCE_FILES)
+        is_fresh = PROCESSED_CACHE.stat().st_mtime > source_mtime
+    except OSError:
+        is_fresh = False
+    
+    merged = None
+    if is_fresh:
+        try:
+            merged = gpd.read_parquet(PROCESSED_CACHE)
+        except CACHE_ERRORS:
+            merged = None  # truncated or corrupt cache: rebuild it below
+    
+    if merged is None:
+        df, gdf = load_data()
+        merged, _ = process_data(df, gdf)
+        write_processed_cache(merged)
     
-    return merged
+    # attrs round-trip through Parquet; the ranked slice is rebuilt from "rank".
+    # Only the map needs geometry, so the slice is a plain DataFrame
+    merged_with_data = pd.DataFrame(merged[merged["rank"] > 0].drop(columns="geometry")).sort_values("rank")
+    return merged, merged_with_data
 
 # ==================== AI INTELLIGENCE FUNCTIONS ====================
 
-def detect_anomalies(merged_gdf):
+def detect_anomalies(data_with_data):
     """Deteksi anomali dalam data"""
-    data_with_data = merged_gdf[merged_gdf["mean_stunting_percent"] > 0].copy()
-    
     anomalies = []
+    # data_with_data is ranked by percentage; anomalies are listed by kecamatan name
+    by_name = data_with_data.sort_values("WADMKC")
     
     # 1. High percentage with low population
-    for _, row in data_with_data.iterrows():
-        if row["jumlah_balita"] < 50 and row["mean_stunting_percent"] > 30:
+    for row in by_name.itertuples(index=False):
+        if row.jumlah_balita < 50 and row.mean_stunting_percent > 30:
             anomalies.append({
                 "type": "high_percent_low_pop",
-                "kecamatan": row["WADMKC"],
-                "detail": f"Stunting tinggi ({row['mean_stunting_percent']:.1f}%) dengan populasi kecil ({row['jumlah_balita']} balita)",
+                "kecamatan": row.WADMKC,
+                "detail": f"Stunting tinggi ({row.mean_stunting_percent:.1f}%) dengan populasi kecil ({row.jumlah_balita} balita)",
                 "severity": "high",
                 "reason": "Kemungkinan: Akses kesehatan terbatas atau faktor ekonomi lokal"
             })
@@ -165,43 +264,41 @@ def detect_anomalies(merged_gdf):
     mean_val = data_with_data["mean_stunting_percent"].mean()
     std_val = data_with_data["mean_stunting_percent"].std()
     
-    for _, row in data_with_data.iterrows():
-        z_score = (row["mean_stunting_percent"] - mean_val) / std_val
+    for row in by_name.itertuples(index=False):
+        z_score = (row.mean_stunting_percent - mean_val) / std_val
         if abs(z_score) > 2:  # More than 2 std deviations
             if z_score > 2:
                 anomalies.append({
                     "type": "statistical_outlier_high",
-                    "kecamatan": row["WADMKC"],
-                    "detail": f"Persentase stunting jauh di atas rata-rata ({row['mean_stunting_percent']:.1f}% vs rata-rata {mean_val:.1f}%)",
+                    "kecamatan": row.WADMKC,
+                    "detail": f"Persentase stunting jauh di atas rata-rata ({row.mean_stunting_percent:.1f}% vs rata-rata {mean_val:.1f}%)",
                     "severity": "high",
                     "reason": "Memerlukan investigasi mendalam untuk identifikasi akar masalah"
                 })
             elif z_score < -2:
                 anomalies.append({
                     "type": "statistical_outlier_low",
-                    "kecamatan": row["WADMKC"],
-                    "detail": f"Persentase stunting sangat rendah ({row['mean_stunting_percent']:.1f}%)",
+                    "kecamatan": row.WADMKC,
+                    "detail": f"Persentase stunting sangat rendah ({row.mean_stunting_percent:.1f}%)",
                     "severity": "success",
                     "reason": "Best practice yang bisa dipelajari kecamatan lain"
                 })
     
     # 3. Efficiency anomaly (high cases despite low percentage)
-    for _, row in data_with_data.iterrows():
-        if row["mean_stunting_percent"] < 20 and row["jumlah_stunting"] > 20:
+    for row in by_name.itertuples(index=False):
+        if row.mean_stunting_percent < 20 and row.jumlah_stunting > 20:
             anomalies.append({
                 "type": "high_volume",
-                "kecamatan": row["WADMKC"],
-                "detail": f"Meski persentase rendah ({row['mean_stunting_percent']:.1f}%), jumlah kasus tetap tinggi ({row['jumlah_stunting']} anak)",
+                "kecamatan": row.WADMKC,
+                "detail": f"Meski persentase rendah ({row.mean_stunting_percent:.1f}%), jumlah kasus tetap tinggi ({row.jumlah_stunting} anak)",
                 "severity": "medium",
                 "reason": "Populasi besar memerlukan resources dan monitoring lebih intensif"
             })
     
     return anomalies
 
-def generate_insights(merged_gdf, total_stunting, total_balita, avg_percent):
+def generate_insights(data_with_data, total_stunting, total_balita, avg_percent):
     """Generate AI insights otomatis"""
-    data_with_data = merged_gdf[merged_gdf["mean_stunting_percent"] > 0].copy()
-    
     insights = []
     
     # Overall performance insight
@@ -226,7 +323,7 @@ def generate_insights(merged_gdf, total_stunting, total_balita, avg_percent):
     
     # Best and worst performers
     best_kec = data_with_data.nsmallest(1, "mean_stunting_percent").iloc[0]
-    worst_kec = data_with_data.nlargest(1, "mean_stunting_percent").iloc[0]
+    worst_kec = data_with_data.iloc[0]
     
     insights.append({
         "icon": "🏆",
@@ -241,7 +338,7 @@ def generate_insights(merged_gdf, total_stunting, total_balita, avg_percent):
     })
     
     # Impact analysis
-    top3 = data_with_data.nlargest(3, "jumlah_stunting")
+    top3 = data_with_data.sort_values("WADMKC").nlargest(3, "jumlah_stunting")
     total_top3 = top3["jumlah_stunting"].sum()
     impact_percent = (total_top3 / total_stunting * 100)
     
@@ -262,22 +359,20 @@ def generate_insights(merged_gdf, total_stunting, total_balita, avg_percent):
     
     return insights
 
-def generate_recommendations(merged_gdf, anomalies):
+def generate_recommendations(merged_gdf, data_with_data, anomalies):
     """Generate smart recommendations"""
-    data_with_data = merged_gdf[merged_gdf["mean_stunting_percent"] > 0].copy()
-    
     recommendations = []
     
     # 1. Priority intervention
-    urgent_kec = data_with_data[data_with_data["mean_stunting_percent"] > 30].nlargest(3, "jumlah_stunting")
+    urgent_kec = data_with_data[data_with_data["mean_stunting_percent"] > 30].sort_values("WADMKC").nlargest(3, "jumlah_stunting")
     if len(urgent_kec) > 0:
         recommendations.append({
             "priority": "URGENT",
             "category": "Intervensi Darurat",
             "action": f"Deployment Tim Khusus ke {len(urgent_kec)} kecamatan terburuk",
             "details": [
-                f"• {row['WADMKC']}: Alokasi {int(row['jumlah_stunting'] * 0.8)} paket bantuan pangan, 2 tenaga kesehatan tambahan"
-                for _, row in urgent_kec.iterrows()
+                f"• {row.WADMKC}: Alokasi {int(row.jumlah_stunting * 0.8)} paket bantuan pangan, 2 tenaga kesehatan tambahan"
+                for row in urgent_kec.itertuples(index=False)
             ],
             "timeline": "1-2 bulan",
             "expected_impact": f"Potensi penurunan {urgent_kec['jumlah_stunting'].sum()} kasus ({(urgent_kec['jumlah_stunting'].sum()/data_with_data['jumlah_stunting'].sum()*100):.1f}% total)"
@@ -307,8 +402,8 @@ def generate_recommendations(merged_gdf, anomalies):
             "category": "Optimasi Resources",
             "action": "Penguatan Infrastruktur di Kecamatan Populasi Tinggi",
             "details": [
-                f"• {row['WADMKC']}: Tambah 1 Posyandu, 3 kader terlatih, screening rutin"
-                for _, row in high_pop.head(3).iterrows()
+                f"• {row.WADMKC}: Tambah 1 Posyandu, 3 kader terlatih, screening rutin"
+                for row in high_pop.sort_values("WADMKC").head(3).itertuples(index=False)
             ],
             "timeline": "6-12 bulan",
             "expected_impact": "Cakupan monitoring meningkat 30-40%"
@@ -330,9 +425,9 @@ def generate_recommendations(merged_gdf, anomalies):
         })
     
     # 5. Data quality
-    no_data_count = len(merged_gdf[merged_gdf["mean_stunting_percent"] == 0])
+    no_data_kec = merged_gdf.attrs["kecamatan_tanpa_data"]
+    no_data_count = len(no_data_kec)
     if no_data_count > 0:
-        no_data_kec = merged_gdf[merged_gdf["mean_stunting_percent"] == 0]["WADMKC"].tolist()
         recommendations.append({
             "priority": "MEDIUM",
             "category": "Kualitas Data",
@@ -350,75 +445,62 @@ def generate_recommendations(merged_gdf, anomalies):
     return recommendations
 
 # ==================== VISUALIZATION FUNCTIONS (SAMA SEPERTI SEBELUMNYA) ====================
+def hash_geodataframe(g):
+    """Hash isi GeoDataFrame (atribut + WKB geometri) untuk cache Streamlit"""
+    return (
+        pd.util.hash_pandas_object(g.drop(columns="geometry")).values.tobytes()
+        + b"".join(g.geometry.to_wkb())
+    )
+
 def create_folium_map(merged_gdf):
     """Create interactive Folium map"""
     m = folium.Map(location=[-7.45, 112.7], zoom_start=11, tiles="OpenStreetMap")
     
-    Choropleth(
-        geo_data=merged_gdf.__geo_interface__,
-        data=merged_gdf,
-        columns=["WADMKC", "mean_stunting"],
-        key_on="feature.properties.WADMKC",
-        fill_color="RdYlGn_r",
-        nan_fill_color="#e2e8f0",
-        fill_opacity=0.7,
-        line_opacity=0.3,
-        legend_name="Persentase Rata-rata Stunting (%)"
-    ).add_to(m)
-    
-    popup_template = """
-    <div style="font-family: Arial; font-size:14px; line-height:1.8; padding:8px; min-width:220px;">
-        <div style="font-weight:700; font-size:18px; margin-bottom:10px; color:#1e40af;">
-            📍 {WADMKC}
-        </div>
-        <hr style="margin: 8px 0; border: none; border-top: 2px solid #e2e8f0;">
-        <div><b>👶 Jumlah Balita:</b> {jumlah_balita}</div>
-        <div><b>⚠️ Jumlah Stunting:</b> {jumlah_stunting}</div>
-        <div><b>📊 Persentase:</b> <span style="color:{color}; font-weight:bold;">{mean_stunting_percent:.2f}%</span></div>
-        <div><b>🏷️ Kategori:</b> <span style="color:{color}; font-weight:bold;">{category}</span></div>
-        {rank_html}
-    </div>
-    """
-    
-    for _, row in merged_gdf.iterrows():
-        rank_html = f'<div><b>🏆 Ranking:</b> #{int(row["rank"])}</div>' if row["rank"] > 0 else ""
-        
-        html = popup_template.format(
-            WADMKC=row["WADMKC"],
-            jumlah_balita=int(row["jumlah_balita"]),
-            jumlah_stunting=int(row["jumlah_stunting"]),
-            mean_stunting_percent=row["mean_stunting_percent"],
-            category=row["category"],
-            color=row["color"],
-            rank_html=rank_html
+    map_gdf = merged_gdf[["WADMKC", "jumlah_balita", "jumlah_stunting", "mean_stunting_percent",
+                          "category", "color", "geometry"]].copy()
+    map_gdf["ranking"] = np.where(merged_gdf["rank"] > 0, "#" + merged_gdf["rank"].astype(str), "-")
+    
+    # One layer: fill follows the category colors of the legend, popup and
+    # tooltip tables are formatted client-side from feature properties
+    folium.GeoJson(
+        map_gdf.to_json(),
+        style_function=lambda feature: {
+            "fillColor": feature["properties"]["color"],
+            "fillOpacity": 0.7,
+            "color": "#555",
+            "weight": 1
+        },
+        tooltip=folium.GeoJsonTooltip(
+            fields=["WADMKC", "mean_stunting_percent", "jumlah_stunting", "jumlah_balita"],
+            aliases=["Kecamatan", "Persentase (%)", "Jumlah Stunting", "Jumlah Balita"],
+            localize=True
+        ),
+        popup=folium.GeoJsonPopup(
+            fields=["WADMKC", "jumlah_balita", "jumlah_stunting", "mean_stunting_percent", "category", "ranking"],
+            aliases=["📍 Kecamatan", "👶 Jumlah Balita", "⚠️ Jumlah Stunting", "📊 Persentase (%)", "🏷️ Kategori", "🏆 Ranking"],
+            localize=True,
+            style="font-family: Arial; font-size: 14px; line-height: 1.8; min-width: 220px;",
+            max_width=300
         )
-        
-        iframe = folium.IFrame(html, width=280, height=220)
-        popup = folium.Popup(iframe, max_width=300)
-        tooltip_text = f"{row['WADMKC']} — {row['mean_stunting_percent']:.2f}% ({int(row['jumlah_stunting'])}/{int(row['jumlah_balita'])})"
-        
-        folium.GeoJson(
-            row["geometry"].__geo_interface__,
-            style_function=lambda feat, c=row["color"]: {
-                "fillOpacity": 0,
-                "color": c,
-                "weight": 2
-            },
-            popup=popup,
-            tooltip=folium.Tooltip(tooltip_text)
-        ).add_to(m)
-    
+    ).add_to(m)
+
     return m
 
-def create_bar_chart(merged_gdf):
-    data_sorted = merged_gdf[merged_gdf["mean_stunting_percent"] > 0].sort_values("mean_stunting_percent", ascending=True)
+@st.cache_resource(hash_funcs={gpd.GeoDataFrame: hash_geodataframe})
+def build_map_html(merged_gdf):
+    """Render peta Folium ke HTML (di-cache per isi data, dipakai bersama antar rerun)"""
+    return create_folium_map(merged_gdf).get_root().render()
+
+@st.cache_data(show_spinner=False)
+def create_bar_chart(data_with_data):
+    data_sorted = data_with_data.iloc[::-1]
     
     fig = go.Figure()
     fig.add_trace(go.Bar(
         y=data_sorted["WADMKC"],
         x=data_sorted["mean_stunting_percent"],
         orientation='h',
-        marker=dict(color=data_sorted["mean_stunting_percent"], colorscale='RdYlGn_r', showscale=True, colorbar=dict(title="Persentase (%)")),
+        marker=dict(color=data_sorted["mean_stunting_percent"], colorscale='RdYlGn_r'),
         text=data_sorted["mean_stunting_percent"].apply(lambda x: f"{x:.2f}%"),
         textposition='outside',
         hovertemplate='<b>%{y}</b><br>Persentase: %{x:.2f}%<extra></extra>'
@@ -428,14 +510,15 @@ def create_bar_chart(merged_gdf):
                       height=500, margin=dict(l=20, r=20, t=40, b=20), plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)')
     return fig
 
-def create_pie_chart(merged_gdf):
-    data_with_data = merged_gdf[merged_gdf["mean_stunting_percent"] > 0]
+@st.cache_data(show_spinner=False)
+def create_pie_chart(data_with_data):
     category_counts = data_with_data["category"].value_counts()
+    category_counts = category_counts[category_counts > 0]
     colors_map = {"Rendah": "#22c55e", "Sedang": "#eab308", "Tinggi": "#ef4444"}
     
     fig = go.Figure(data=[go.Pie(
         labels=category_counts.index, values=category_counts.values,
-        marker=dict(colors=[colors_map.get(cat, "#94a3b8") for cat in category_counts.index]),
+        marker=dict(colors=category_counts.index.map(colors_map).fillna("#94a3b8").tolist()),
         hole=0.4, textinfo='label+percent', textfont_size=14,
         hovertemplate='<b>%{label}</b><br>Jumlah: %{value}<br>Persentase: %{percent}<extra></extra>'
     )])
@@ -443,6 +526,7 @@ def create_pie_chart(merged_gdf):
     fig.update_layout(title="Distribusi Kategori Stunting", height=400, margin=dict(l=20, r=20, t=40, b=20), paper_bgcolor='rgba(0,0,0,0)')
     return fig
 
+@st.cache_data(show_spinner=False)
 def create_gauge_chart(avg_percent):
     fig = go.Figure(go.Indicator(
         mode="gauge+number+delta", value=avg_percent, domain={'x': [0, 1], 'y': [0, 1]},
@@ -457,29 +541,37 @@ def create_gauge_chart(avg_percent):
     fig.update_layout(height=400, margin=dict(l=20, r=20, t=80, b=20), paper_bgcolor='rgba(0,0,0,0)', font={'color': "darkblue", 'family': "Arial"})
     return fig
 
-def create_scatter_bubble(merged_gdf):
-    data_with_data = merged_gdf[merged_gdf["mean_stunting_percent"] > 0].copy()
-    
+@st.cache_data(show_spinner=False)
+def create_scatter_bubble(data_with_data):
     fig = go.Figure()
-    fig.add_trace(go.Scatter(
-        x=data_with_data["jumlah_balita"], y=data_with_data["mean_stunting_percent"], mode='markers+text',
+    # WebGL markers; kecamatan names go in hovertext so no SVG text layout is needed
+    fig.add_trace(go.Scattergl(
+        x=data_with_data["jumlah_balita"], y=data_with_data["mean_stunting_percent"], mode='markers',
         marker=dict(size=data_with_data["jumlah_stunting"]*2, color=data_with_data["mean_stunting_percent"],
                     colorscale='RdYlGn_r', showscale=True, colorbar=dict(title="% Stunting"),
                     line=dict(width=2, color='white'), opacity=0.8),
-        text=data_with_data["WADMKC"], textposition="top center", textfont=dict(size=10),
-        hovertemplate='<b>%{text}</b><br>Jumlah Balita: %{x}<br>Persentase Stunting: %{y:.2f}%<br><extra></extra>'
+        hovertext=data_with_data["WADMKC"],
+        hovertemplate='<b>%{hovertext}</b><br>Jumlah Balita: %{x}<br>Persentase Stunting: %{y:.2f}%<br><extra></extra>'
+    ))
+    
+    # Always-on labels only for the three largest bubbles, so text layout stays bounded
+    top_3 = data_with_data.nlargest(3, "jumlah_stunting")
+    fig.add_trace(go.Scatter(
+        x=top_3["jumlah_balita"], y=top_3["mean_stunting_percent"], mode='text',
+        text=top_3["WADMKC"], textposition="top center", textfont=dict(size=10), hoverinfo='skip'
     ))
     
     fig.update_layout(title="Analisis Korelasi: Jumlah Balita vs Persentase Stunting",
                       xaxis_title="Jumlah Balita", yaxis_title="Persentase Stunting (%)",
-                      height=500, hovermode='closest', plot_bgcolor='rgba(240,240,240,0.5)', paper_bgcolor='rgba(0,0,0,0)')
+                      height=500, hovermode='closest', showlegend=False, plot_bgcolor='rgba(240,240,240,0.5)', paper_bgcolor='rgba(0,0,0,0)')
     
     fig.add_hline(y=20, line_dash="dash", line_color="green", opacity=0.5, annotation_text="Batas Rendah (20%)")
     fig.add_hline(y=30, line_dash="dash", line_color="red", opacity=0.5, annotation_text="Batas Tinggi (30%)")
     return fig
 
-def create_treemap(merged_gdf):
-    data_with_data = merged_gdf[merged_gdf["mean_stunting_percent"] > 0].copy()
+@st.cache_data(show_spinner=False)
+def create_treemap(data_with_data):
+    data_with_data = data_with_data.copy()
     data_with_data["label"] = data_with_data.apply(lambda row: f"{row['WADMKC']}<br>{row['mean_stunting_percent']:.1f}%", axis=1)
     
     fig = go.Figure(go.Treemap(
@@ -494,18 +586,22 @@ def create_treemap(merged_gdf):
                       height=500, margin=dict(l=10, r=10, t=50, b=10))
     return fig
 
-def create_radar_chart(merged_gdf):
-    top_kec = merged_gdf[merged_gdf["mean_stunting_percent"] > 0].nlargest(6, "mean_stunting_percent")
+@st.cache_data(show_spinner=False)
+def create_radar_chart(data_with_data):
+    top_kec = data_with_data.head(6)
     categories = ['Persentase<br>Stunting', 'Jumlah<br>Kasus', 'Jumlah<br>Balita']
     
+    max_kasus = top_kec["jumlah_stunting"].max()
+    max_balita = top_kec["jumlah_balita"].max()
+    
     fig = go.Figure()
-    for _, row in top_kec.iterrows():
-        percent_norm = row["mean_stunting_percent"] * 2
-        kasus_norm = (row["jumlah_stunting"] / top_kec["jumlah_stunting"].max()) * 100
-        balita_norm = (row["jumlah_balita"] / top_kec["jumlah_balita"].max()) * 100
+    for row in top_kec.itertuples(index=False):
+        percent_norm = row.mean_stunting_percent * 2
+        kasus_norm = (row.jumlah_stunting / max_kasus) * 100
+        balita_norm = (row.jumlah_balita / max_balita) * 100
         
         fig.add_trace(go.Scatterpolar(
-            r=[percent_norm, kasus_norm, balita_norm], theta=categories, fill='toself', name=row["WADMKC"],
+            r=[percent_norm, kasus_norm, balita_norm], theta=categories, fill='toself', name=row.WADMKC,
             hovertemplate='<b>%{fullData.name}</b><br>%{theta}: %{r:.1f}<br><extra></extra>'
         ))
     
@@ -514,9 +610,8 @@ def create_radar_chart(merged_gdf):
                       legend=dict(orientation="h", yanchor="bottom", y=-0.2, xanchor="center", x=0.5))
     return fig
 
-def create_box_plot(merged_gdf):
-    data_with_data = merged_gdf[merged_gdf["mean_stunting_percent"] > 0]
-    
+@st.cache_data(show_spinner=False)
+def create_box_plot(data_with_data):
     fig = go.Figure()
     fig.add_trace(go.Box(
         y=data_with_data["mean_stunting_percent"], name="Persentase Stunting", marker_color='#6366f1',
@@ -644,19 +739,19 @@ def main():
     st.markdown('<div class="sub-header">Kabupaten Sidoarjo - Jawa Timur</div>', unsafe_allow_html=True)
     
     with st.spinner("⏳ Memuat data dan menganalisis..."):
-        df, gdf = load_data()
-        merged_gdf = process_data(df, gdf)
+        merged_gdf, data_with_data = load_processed_data()
     
     total_kecamatan = len(merged_gdf)
-    kec_with_data = len(merged_gdf[merged_gdf["mean_stunting_percent"] > 0])
-    total_balita = int(merged_gdf["jumlah_balita"].sum())
-    total_stunting = int(merged_gdf["jumlah_stunting"].sum())
-    avg_percent = (total_stunting / total_balita * 100) if total_balita > 0 else 0
+    kec_with_data = len(data_with_data)
+    totals = merged_gdf.attrs["totals"]
+    total_balita = totals["balita"]
+    total_stunting = totals["stunting"]
+    avg_percent = totals["avg_percent"]
     
     # Generate AI insights
-    insights = generate_insights(merged_gdf, total_stunting, total_balita, avg_percent)
-    anomalies = detect_anomalies(merged_gdf)
-    recommendations = generate_recommendations(merged_gdf, anomalies)
+    insights = generate_insights(data_with_data, total_stunting, total_balita, avg_percent)
+    anomalies = detect_anomalies(data_with_data)
+    recommendations = generate_recommendations(merged_gdf, data_with_data, anomalies)
     
     col1, col2, col3, col4 = st.columns(4)
     
@@ -670,12 +765,7 @@ def main():
         st.metric(label="👶 Total Balita", value=f"{total_balita:,}")
     
     with col4:
-        data_with_categories = merged_gdf[merged_gdf["mean_stunting_percent"] > 0]
-        if len(data_with_categories) > 0:
-            kategori_tertinggi = data_with_categories["category"].value_counts().idxmax()
-        else:
-            kategori_tertinggi = "N/A"
-        st.metric(label="🏷️ Kategori Dominan", value=kategori_tertinggi)
+        st.metric(label="🏷️ Kategori Dominan", value=merged_gdf.attrs["kategori_dominan"])
     
     st.markdown("---")
     
@@ -705,8 +795,7 @@ def main():
         col_map, col_legend = st.columns([3, 1])
         
         with col_map:
-            folium_map = create_folium_map(merged_gdf)
-            st_folium(folium_map, width=None, height=600)
+            components.html(build_map_html(merged_gdf), height=600)
         
         with col_legend:
             st.markdown("### 📊 Legend")
@@ -734,22 +823,21 @@ def main():
             st.markdown("---")
             
             st.markdown("### 🏆 Top 5 Kecamatan")
-            top_5 = merged_gdf[merged_gdf["mean_stunting_percent"] > 0].nlargest(5, "mean_stunting_percent")
+            top_5 = data_with_data.head(5)
             
-            for idx, row in top_5.iterrows():
-                st.markdown(f"""
-                <div style="padding: 0.8rem; margin-bottom: 0.5rem; background: white; border-left: 4px solid {row['color']}; border-radius: 0.3rem; box-shadow: 0 1px 3px rgba(0,0,0,0.1);">
-                    <div style="font-weight: 600; font-size: 1rem;">{row['WADMKC']}</div>
-                    <div style="color: {row['color']}; font-size: 1.3rem; font-weight: bold;">{row['mean_stunting_percent']:.2f}%</div>
-                    <div style="font-size: 0.85rem; color: #64748b;">{int(row['jumlah_stunting'])}/{int(row['jumlah_balita'])} balita</div>
+            # One markdown element for all cards instead of one per kecamatan
+            st.markdown("".join(f"""
+                <div style="padding: 0.8rem; margin-bottom: 0.5rem; background: white; border-left: 4px solid {row.color}; border-radius: 0.3rem; box-shadow: 0 1px 3px rgba(0,0,0,0.1);">
+                    <div style="font-weight: 600; font-size: 1rem;">{row.WADMKC}</div>
+                    <div style="color: {row.color}; font-size: 1.3rem; font-weight: bold;">{row.mean_stunting_percent:.2f}%</div>
+                    <div style="font-size: 0.85rem; color: #64748b;">{int(row.jumlah_stunting)}/{int(row.jumlah_balita)} balita</div>
                 </div>
-                """, unsafe_allow_html=True)
+                """ for row in top_5.itertuples(index=False)), unsafe_allow_html=True)
     
     with tab2:
         st.subheader("📊 Analisis Data Stunting Komprehensif")
         
         # AI Insight for analysis tab
-        data_with_data = merged_gdf[merged_gdf["mean_stunting_percent"] > 0]
         correlation = data_with_data[["jumlah_balita", "mean_stunting_percent"]].corr().iloc[0, 1]
         
         if abs(correlation) < 0.3:
@@ -770,10 +858,10 @@ def main():
         col_chart1, col_chart2 = st.columns(2)
         
         with col_chart1:
-            st.plotly_chart(create_bar_chart(merged_gdf), use_container_width=True)
+            st.plotly_chart(create_bar_chart(data_with_data), use_container_width=True)
         
         with col_chart2:
-            st.plotly_chart(create_pie_chart(merged_gdf), use_container_width=True)
+            st.plotly_chart(create_pie_chart(data_with_data), use_container_width=True)
         
         st.markdown("---")
         
@@ -781,10 +869,10 @@ def main():
         col_chart3, col_chart4 = st.columns(2)
         
         with col_chart3:
-            st.plotly_chart(create_scatter_bubble(merged_gdf), use_container_width=True)
+            st.plotly_chart(create_scatter_bubble(data_with_data), use_container_width=True)
         
         with col_chart4:
-            st.plotly_chart(create_treemap(merged_gdf), use_container_width=True)
+            st.plotly_chart(create_treemap(data_with_data), use_container_width=True)
         
         st.markdown("---")
         
@@ -792,10 +880,10 @@ def main():
         col_chart5, col_chart6 = st.columns(2)
         
         with col_chart5:
-            st.plotly_chart(create_radar_chart(merged_gdf), use_container_width=True)
+            st.plotly_chart(create_radar_chart(data_with_data), use_container_width=True)
         
         with col_chart6:
-            st.plotly_chart(create_box_plot(merged_gdf), use_container_width=True)
+            st.plotly_chart(create_box_plot(data_with_data), use_container_width=True)
         
         st.markdown("---")
         
@@ -814,8 +902,8 @@ def main():
                 "Nilai": [
                     f"{kec_with_data} dari {total_kecamatan}",
                     f"{total_kecamatan - kec_with_data}",
-                    f"{merged_gdf[merged_gdf['mean_stunting_percent'] > 0]['mean_stunting_percent'].max():.2f}%",
-                    f"{merged_gdf[merged_gdf['mean_stunting_percent'] > 0]['mean_stunting_percent'].min():.2f}%",
+                    f"{data_with_data['mean_stunting_percent'].max():.2f}%",
+                    f"{data_with_data['mean_stunting_percent'].min():.2f}%",
                     f"{avg_percent:.2f}%"
                 ]
             })
@@ -823,7 +911,7 @@ def main():
         
         with col_stat2:
             st.markdown("#### 🎯 Kecamatan Tanpa Data")
-            no_data_kec = merged_gdf[merged_gdf["mean_stunting_percent"] == 0]["WADMKC"].tolist()
+            no_data_kec = merged_gdf.attrs["kecamatan_tanpa_data"]
             if no_data_kec:
                 for kec in no_data_kec:
                     st.markdown(f"- {kec}")